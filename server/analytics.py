@@ -1,47 +1,121 @@
+from __future__ import annotations
+
 import sys
+import csv
+import io
 import json
-import pandas as pd
-import numpy as np
-from datetime import datetime, timedelta
+import functools
+import operator
+import re
+from datetime import datetime, timedelta, timezone
 import sqlite3
-from typing import Dict, List, Any
+import threading
+import uuid
+from typing import Dict, Iterator, List, Tuple, Any, TYPE_CHECKING
+
+# pandas/numpy/pyarrow are imported inside the functions that need them,
+# so CLI actions that don't touch DataFrames skip their import cost
+if TYPE_CHECKING:
+    import pandas as pd
+    import numpy as np
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder
+    orjson = None
+
+_local = threading.local()
+
+# Trailing UTC offset on a timestamp, e.g. "2024-02-11T23:30:00-05:00"
+_UTC_OFFSET_RE = re.compile(r'(\d:\d{2}(?::\d{2})?(?:\.\d+)?)\s*(?:Z|UTC|[+-]\d{2}(?::?\d{2})?)$', re.IGNORECASE)
+
+# Description keywords that flag a recurring subscription charge
+_SUBSCRIPTION_KEYWORDS = ('netflix', 'spotify', 'subscription', 'streaming', 'premium', 'pro')
+
+def _subscription_mask(desc_lower: pd.Series) -> np.ndarray:
+    """Boolean mask of lowercase descriptions containing a subscription keyword"""
+    import numpy as np
+    
+    # NumPy < 2 has no variable-width string dtype
+    if not hasattr(np, 'strings'):
+        return _subscription_mask_object(desc_lower)
+    
+    # Variable-width strings: a fixed-width '<U' array would size every row
+    # to the longest description in the chunk
+    desc_lower = desc_lower.fillna('').to_numpy(dtype=object).astype(np.dtypes.StringDType())
+    mask = np.zeros(len(desc_lower), dtype=bool)
+    for keyword in _SUBSCRIPTION_KEYWORDS:
+        mask |= np.strings.find(desc_lower, keyword) >= 0
+    return mask
+
+def _subscription_mask_object(desc_lower: pd.Series) -> np.ndarray:
+    """_subscription_mask via plain substring checks on the object column"""
+    import numpy as np
+    
+    desc_lower = desc_lower.fillna('')
+    mask = np.zeros(len(desc_lower), dtype=bool)
+    for keyword in _SUBSCRIPTION_KEYWORDS:
+        mask |= desc_lower.str.contains(keyword, regex=False).to_numpy(dtype=bool)
+    return mask
 
-def connect_db():
-    return sqlite3.connect('finsight.db')
+def connect_db() -> sqlite3.Connection:
+    """Return this thread's cached connection, opening and tuning it on first use"""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect('finsight.db')
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        conn.execute('PRAGMA cache_size=-20000')
+        # Refresh planner stats (e.g. for idx_tx_user_type_date) when SQLite
+        # judges them stale; cheap when they aren't
+        conn.execute('PRAGMA optimize')
+        _local.conn = conn
+    return conn
 
 def analyze_spending_patterns(user_id: str) -> Dict[str, Any]:
     """Analyze spending patterns and generate insights"""
     conn = connect_db()
     
-    # Get user transactions
-    query = """
-    SELECT * FROM transactions 
+    # Category analysis
+    category_query = """
+    SELECT category, SUM(amount), AVG(amount) FROM transactions
     WHERE user_id = ? AND type = 'expense'
-    ORDER BY date DESC
+    GROUP BY category
     """
     
-    df = pd.read_sql_query(query, conn, params=(user_id,))
-    conn.close()
+    category_totals = {}
+    category_avg = {}
+    for category, total, avg in conn.execute(category_query, (user_id,)):
+        category_totals[category] = total
+        category_avg[category] = avg
     
-    if df.empty:
+    if not category_totals:
         return {"insights": [], "category_analysis": {}, "trends": {}}
     
-    # Convert date column
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.to_period('M')
-    
-    # Category analysis
-    category_totals = df.groupby('category')['amount'].sum().to_dict()
-    category_avg = df.groupby('category')['amount'].mean().to_dict()
+    # Monthly trends; dates strftime can't read (e.g. raw "01/20/2024" strings
+    # saved by older uploads) land in a NULL month and are reported separately
+    monthly_query = """
+    SELECT strftime('%Y-%m', date) AS month, SUM(amount), COUNT(*) FROM transactions
+    WHERE user_id = ? AND type = 'expense'
+    GROUP BY month
+    ORDER BY month
+    """
     
-    # Monthly trends
-    monthly_spending = df.groupby('month')['amount'].sum()
+    monthly_spending = {}
+    undated_total, undated_count = 0.0, 0
+    for month, total, count in conn.execute(monthly_query, (user_id,)):
+        if month is None:
+            undated_total, undated_count = total, count
+        else:
+            monthly_spending[month] = total
     
     # Calculate insights
     insights = []
     
     # Top spending category
-    top_category = max(category_totals.items(), key=lambda x: x[1])
+    top_category = max(category_totals.items(), key=operator.itemgetter(1))
     insights.append({
         "type": "top_category",
         "message": f"Your highest spending category is {top_category[0]} with ${top_category[1]:.2f} total",
@@ -49,24 +123,35 @@ def analyze_spending_patterns(user_id: str) -> Dict[str, Any]:
         "amount": top_category[1]
     })
     
-    # Month-over-month change
-    if len(monthly_spending) >= 2:
-        current_month = monthly_spending.iloc[-1]
-        previous_month = monthly_spending.iloc[-2]
+    # Month-over-month change (undefined when last month's total is zero)
+    monthly_totals = list(monthly_spending.values())
+    if len(monthly_totals) >= 2 and monthly_totals[-2] != 0:
+        previous_month, current_month = monthly_totals[-2:]
         change_pct = ((current_month - previous_month) / previous_month) * 100
         
         insights.append({
             "type": "monthly_change",
             "message": f"Your spending {'increased' if change_pct > 0 else 'decreased'} by {abs(change_pct):.1f}% this month",
             "change_percent": change_pct,
-            "current_amount": float(current_month),
-            "previous_amount": float(previous_month)
+            "current_amount": current_month,
+            "previous_amount": previous_month
+        })
+    
+    # Expenses missing from monthly trends
+    if undated_count:
+        insights.append({
+            "type": "undated_expenses",
+            "message": f"{undated_count} expense{'s' if undated_count != 1 else ''} (${undated_total:.2f}) "
+                       f"{'have dates' if undated_count != 1 else 'has a date'} that couldn't be read and "
+                       f"{'are' if undated_count != 1 else 'is'} left out of monthly trends",
+            "amount": undated_total,
+            "count": undated_count
         })
     
     return {
         "insights": insights,
         "category_analysis": category_totals,
-        "monthly_trends": monthly_spending.to_dict(),
+        "monthly_trends": monthly_spending,
         "category_averages": category_avg
     }
 
@@ -77,94 +162,147 @@ def generate_savings_tips(user_id: str) -> List[Dict[str, Any]]:
     # Get recent transactions (last 3 months)
     three_months_ago = (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d')
     
-    query = """
-    SELECT * FROM transactions 
+    # Analyze spending by category
+    category_query = """
+    SELECT category, SUM(amount), COUNT(*) FROM transactions
     WHERE user_id = ? AND type = 'expense' AND date >= ?
-    ORDER BY date DESC
+    GROUP BY category
     """
     
-    df = pd.read_sql_query(query, conn, params=(user_id, three_months_ago))
-    conn.close()
-    
     tips = []
     
-    if df.empty:
+    category_sum = {}
+    category_count = {}
+    for category, total, count in conn.execute(category_query, (user_id, three_months_ago)):
+        category_sum[category] = total
+        category_count[category] = count
+    
+    if not category_sum:
         return tips
     
-    # Analyze spending by category
-    category_spending = df.groupby('category')['amount'].agg(['sum', 'count', 'mean'])
+    # Subscription analysis, streamed in chunks with a running total
+    subscription_query = """
+    SELECT amount, lower(description) AS desc_lc FROM transactions
+    WHERE user_id = ? AND type = 'expense' AND date >= ?
+    """
+    
+    import pandas as pd
+    
+    subscription_total = 0.0
+    for chunk in pd.read_sql_query(subscription_query, conn, params=(user_id, three_months_ago), chunksize=50000):
+        subscription_mask = _subscription_mask(chunk['desc_lc'])
+        subscription_total += chunk.loc[subscription_mask, 'amount'].sum()
     
     # Dining out analysis
-    if 'Food & Dining' in category_spending.index:
-        dining_total = category_spending.loc['Food & Dining', 'sum']
-        dining_count = category_spending.loc['Food & Dining', 'count']
-        dining_avg = category_spending.loc['Food & Dining', 'mean']
+    if 'Food & Dining' in category_sum:
+        dining_total = category_sum['Food & Dining']
+        dining_count = category_count['Food & Dining']
         
         if dining_total > 300:  # If spending more than $300/month on dining
             potential_savings = dining_total * 0.3  # 30% reduction
             tips.append({
                 "category": "Food & Dining",
                 "recommendation": f"You spent ${dining_total:.2f} on dining out. Consider cooking at home {min(dining_count // 2, 10)} more times per month.",
-                "potential_savings": float(potential_savings),
+                "potential_savings": potential_savings,
                 "confidence": 0.85
             })
     
-    # Subscription analysis
-    subscription_keywords = ['netflix', 'spotify', 'subscription', 'streaming', 'premium', 'pro']
-    subscription_transactions = df[df['description'].str.lower().str.contains('|'.join(subscription_keywords), na=False)]
-    
-    if not subscription_transactions.empty:
-        subscription_total = subscription_transactions['amount'].sum()
-        if subscription_total > 50:  # More than $50 in subscriptions
-            tips.append({
-                "category": "Subscriptions",
-                "recommendation": f"You have ${subscription_total:.2f} in subscription services. Review and cancel unused subscriptions.",
-                "potential_savings": float(subscription_total * 0.4),  # 40% potential savings
-                "confidence": 0.75
-            })
+    if subscription_total > 50:  # More than $50 in subscriptions
+        tips.append({
+            "category": "Subscriptions",
+            "recommendation": f"You have ${subscription_total:.2f} in subscription services. Review and cancel unused subscriptions.",
+            "potential_savings": subscription_total * 0.4,  # 40% potential savings
+            "confidence": 0.75
+        })
     
     # Transportation analysis
-    if 'Transportation' in category_spending.index:
-        transport_total = category_spending.loc['Transportation', 'sum']
+    if 'Transportation' in category_sum:
+        transport_total = category_sum['Transportation']
         if transport_total > 200:  # More than $200/month
             potential_savings = transport_total * 0.25
             tips.append({
                 "category": "Transportation",
                 "recommendation": f"Consider using public transport or carpooling to reduce your ${transport_total:.2f} monthly transportation costs.",
-                "potential_savings": float(potential_savings),
+                "potential_savings": potential_savings,
                 "confidence": 0.70
             })
     
     return tips
 
+# Category keywords used by both the single-row and the vectorized categorizer,
+# in match-priority order
+CATEGORY_KEYWORDS: Tuple[Tuple[str, Tuple[str, ...]], ...] = (
+    ('Food & Dining', ('restaurant', 'cafe', 'starbucks', 'mcdonald', 'pizza', 'food', 'dining', 'grocery', 'supermarket')),
+    ('Transportation', ('uber', 'lyft', 'gas', 'fuel', 'parking', 'taxi', 'metro', 'bus', 'train')),
+    ('Shopping', ('amazon', 'walmart', 'target', 'shopping', 'store', 'retail', 'purchase')),
+    ('Bills & Utilities', ('electric', 'water', 'internet', 'phone', 'utility', 'bill', 'payment')),
+    ('Entertainment', ('movie', 'theater', 'netflix', 'spotify', 'game', 'entertainment')),
+    ('Healthcare', ('doctor', 'hospital', 'pharmacy', 'medical', 'health', 'clinic')),
+    ('Education', ('tuition', 'book', 'school', 'education', 'course', 'class'))
+)
+
+# One alternation per category, compiled once at import
+_CATEGORY_PATTERNS = tuple(
+    (category, re.compile('|'.join(map(re.escape, keywords))))
+    for category, keywords in CATEGORY_KEYWORDS
+)
+
+@functools.lru_cache(maxsize=8192)
+def _categorize_desc_lower(description_lower: str) -> str:
+    for category, pattern in _CATEGORY_PATTERNS:
+        if pattern.search(description_lower):
+            return category
+    
+    return 'Other'
+
 def categorize_transaction(description: str, amount: float) -> str:
     """Auto-categorize transactions based on description"""
-    description_lower = description.lower()
-    
-    # Define category keywords
-    categories = {
-        'Food & Dining': ['restaurant', 'cafe', 'starbucks', 'mcdonald', 'pizza', 'food', 'dining', 'grocery', 'supermarket'],
-        'Transportation': ['uber', 'lyft', 'gas', 'fuel', 'parking', 'taxi', 'metro', 'bus', 'train'],
-        'Shopping': ['amazon', 'walmart', 'target', 'shopping', 'store', 'retail', 'purchase'],
-        'Bills & Utilities': ['electric', 'water', 'internet', 'phone', 'utility', 'bill', 'payment'],
-        'Entertainment': ['movie', 'theater', 'netflix', 'spotify', 'game', 'entertainment'],
-        'Healthcare': ['doctor', 'hospital', 'pharmacy', 'medical', 'health', 'clinic'],
-        'Education': ['tuition', 'book', 'school', 'education', 'course', 'class']
-    }
+    return _categorize_desc_lower(description.lower())
+
+def categorize_descriptions(desc_lower: pd.Series) -> pd.Series:
+    """Vectorized categorize_transaction over a Series of lowercase descriptions"""
+    import pandas as pd
     
-    for category, keywords in categories.items():
-        if any(keyword in description_lower for keyword in keywords):
-            return category
+    # Bank exports repeat the same descriptions, so only match each distinct
+    # one, through the same memoized matcher as categorize_transaction
+    codes, uniques = pd.factorize(desc_lower)
+    category = pd.Series([_categorize_desc_lower(desc) for desc in uniques], dtype=object)
     
-    return 'Other'
+    return pd.Series(category.to_numpy().take(codes), index=desc_lower.index, dtype=object)
+
+def _read_csv_batches(csv_data: str) -> Iterator[pd.DataFrame]:
+    """Yield uploaded CSV data as a sequence of DataFrame batches"""
+    import pandas as pd
+    
+    try:
+        import pyarrow as pa
+        import pyarrow.csv as pacsv
+    except ImportError:  # fall back to the pandas CSV parser
+        pa = None
+    
+    if pa is not None:
+        # Read every column as text so a late block can't contradict the types
+        # inferred from the first one; amounts and dates are coerced afterwards
+        header = next(csv.reader(io.StringIO(csv_data)), [])
+        reader = pacsv.open_csv(
+            pa.BufferReader(pa.py_buffer(csv_data.encode())),
+            read_options=pacsv.ReadOptions(block_size=1 << 20),
+            convert_options=pacsv.ConvertOptions(
+                column_types={name: pa.string() for name in header},
+                strings_can_be_null=True
+            )
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(io.StringIO(csv_data), chunksize=10000)
 
 def process_csv_transactions(csv_data: str, user_id: str) -> Dict[str, Any]:
     """Process CSV data and return categorized transactions"""
+    import pandas as pd
+    import numpy as np
+    
     try:
-        # Parse CSV data
-        from io import StringIO
-        df = pd.read_csv(StringIO(csv_data))
-        
         # Standardize column names (handle different bank formats)
         column_mapping = {
             'description': ['description', 'memo', 'transaction', 'details'],
@@ -172,46 +310,101 @@ def process_csv_transactions(csv_data: str, user_id: str) -> Dict[str, Any]:
             'date': ['date', 'transaction_date', 'posted_date']
         }
         
-        # Find matching columns
-        for standard_col, possible_cols in column_mapping.items():
-            for col in df.columns:
-                if col.lower() in possible_cols:
-                    df = df.rename(columns={col: standard_col})
-                    break
-        
         # Process transactions
         results = {
-            'total_transactions': len(df),
+            'total_transactions': 0,
             'processed_transactions': 0,
+            'transactions_saved': 0,
+            'skipped_transactions': 0,
             'categories': {},
             'insights': []
         }
         
-        for _, row in df.iterrows():
-            try:
-                description = str(row.get('description', 'Unknown'))
-                amount = float(row.get('amount', 0))
-                date_str = str(row.get('date', datetime.now().strftime('%Y-%m-%d')))
+        today = datetime.now().strftime('%Y-%m-%d')
+        # Same ISO 8601 format storage.createTransaction writes (Date.toISOString)
+        created_at = datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+        insert_query = "INSERT INTO transactions (id, user_id, description, amount, category, type, date, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        renames = None
+        rows = []
+        
+        # The whole upload is saved in a single transaction, flushed every 10k rows
+        conn = connect_db()
+        with conn:
+            for df in _read_csv_batches(csv_data):
+                # Find matching columns
+                if renames is None:
+                    renames = {}
+                    for standard_col, possible_cols in column_mapping.items():
+                        for col in df.columns:
+                            if col.lower() in possible_cols:
+                                renames[col] = standard_col
+                                break
+                df = df.rename(columns=renames)
+                results['total_transactions'] += len(df)
                 
-                # Determine transaction type
-                transaction_type = 'expense' if amount > 0 else 'income'
-                amount = abs(amount)
+                # Coerce columns once up front; rows whose amount can't be parsed are skipped
+                amount = pd.to_numeric(df['amount'], errors='coerce') if 'amount' in df.columns else 0.0
+                df = df.assign(amount=amount).dropna(subset=['amount'])
+                # Banks disagree on whether debits are positive or negative, so
+                # the sign can't tell spending from income. As the upload route
+                # always has, every non-zero row is saved as an expense
+                df['type'] = np.where(df['amount'] != 0, 'expense', 'income')
+                df['amount'] = df['amount'].abs()
+                if 'description' in df.columns:
+                    df['description'] = df['description'].fillna('Unknown').astype(str)
+                else:
+                    df['description'] = 'Unknown'
+                # Missing dates default to today; dates that are present but
+                # can't be parsed are skipped like bad amounts. Each value is
+                # parsed on its own (fast ISO 8601 path first, then 'mixed'
+                # for the rest) so the result can't depend on which row
+                # happens to start a batch. UTC offsets are dropped rather
+                # than converted, so a row keeps the calendar day it was
+                # recorded on
+                if 'date' in df.columns:
+                    raw_date = df['date'].astype('string').str.strip().replace('', pd.NA)
+                    local_date = raw_date.str.replace(_UTC_OFFSET_RE, r'\1', regex=True)
+                    parsed_date = pd.to_datetime(local_date, format='ISO8601', errors='coerce')
+                    retry = parsed_date.isna() & raw_date.notna()
+                    if retry.any():
+                        parsed_date[retry] = pd.to_datetime(local_date[retry], format='mixed', errors='coerce')
+                    df = df[parsed_date.notna() | raw_date.isna()]
+                    df = df.assign(date=parsed_date.dt.strftime('%Y-%m-%d').fillna(today))
+                else:
+                    df['date'] = today
                 
                 # Auto-categorize
-                category = categorize_transaction(description, amount)
+                df['category'] = categorize_descriptions(df['description'].str.lower())
                 
-                # Update statistics
-                results['processed_transactions'] += 1
-                if category not in results['categories']:
-                    results['categories'][category] = 0
-                results['categories'][category] += 1
+                n = len(df)
+                rows.extend(zip(
+                    [str(uuid.uuid4()) for _ in range(n)],
+                    [user_id] * n,
+                    df['description'].tolist(),
+                    df['amount'].tolist(),
+                    df['category'].tolist(),
+                    df['type'].tolist(),
+                    df['date'].tolist(),
+                    [created_at] * n
+                ))
+                if len(rows) >= 10000:
+                    conn.executemany(insert_query, rows)
+                    rows.clear()
                 
-            except Exception as e:
-                continue
+                # Update statistics
+                results['processed_transactions'] += n
+                for cat, count in df['category'].value_counts().items():
+                    results['categories'][cat] = results['categories'].get(cat, 0) + int(count)
+            
+            if rows:
+                conn.executemany(insert_query, rows)
+        
+        results['transactions_saved'] = results['processed_transactions']
+        results['skipped_transactions'] = results['total_transactions'] - results['processed_transactions']
         
         # Generate processing insights
         if results['categories']:
-            top_category = max(results['categories'].items(), key=lambda x: x[1])
+            top_category = max(results['categories'].items(), key=operator.itemgetter(1))
             results['insights'].append(f"Most common category: {top_category[0]} ({top_category[1]} transactions)")
         
         return results
@@ -219,9 +412,18 @@ def process_csv_transactions(csv_data: str, user_id: str) -> Dict[str, Any]:
     except Exception as e:
         return {"error": f"Failed to process CSV: {str(e)}"}
 
+def write_json(result: Any) -> None:
+    """Write a result to stdout as one line of JSON"""
+    if orjson is not None:
+        sys.stdout.buffer.write(orjson.dumps(result, option=orjson.OPT_SERIALIZE_NUMPY))
+        sys.stdout.buffer.write(b'\n')
+        sys.stdout.buffer.flush()
+    else:
+        print(json.dumps(result))
+
 if __name__ == "__main__":
     if len(sys.argv) < 3:
-        print(json.dumps({"error": "Missing arguments"}))
+        write_json({"error": "Missing arguments"})
         sys.exit(1)
     
     action = sys.argv[1]
@@ -238,7 +440,7 @@ if __name__ == "__main__":
         else:
             result = {"error": "Unknown action"}
         
-        print(json.dumps(result))
+        write_json(result)
         
     except Exception as e:
-        print(json.dumps({"error": str(e)}))
+        write_json({"error": str(e)})
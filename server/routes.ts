@@ -5,8 +5,6 @@ import { hashPassword, verifyPassword, generateToken, authenticateToken } from "
 import { insertUserSchema, insertTransactionSchema, insertInvestmentSchema, insertGoalSchema, loginSchema } from "@shared/schema";
 import { spawn } from "child_process";
 import multer from "multer";
-import csvParser from "csv-parser";
-import { Readable } from "stream";
 
 const upload = multer({ storage: multer.memoryStorage() });
 
@@ -352,48 +350,8 @@ export async function registerRoutes(app: Express): Promise<Server> {
               return res.status(400).json({ message: processResult.error });
             }
             
-            // Process and save transactions
-            const stream = Readable.from([csvData]);
-            const transactions = [];
-            
-            stream
-              .pipe(csvParser())
-              .on('data', async (row) => {
-                try {
-                  // Auto-categorize and save transaction
-                  const description = row.description || row.memo || row.transaction || 'Unknown';
-                  const amount = Math.abs(parseFloat(row.amount || row.debit || row.credit || 0));
-                  const date = row.date || row.transaction_date || row.posted_date || new Date().toISOString().split('T')[0];
-                  const type = amount > 0 ? 'expense' : 'income';
-                  
-                  // Simple categorization
-                  let category = 'Other';
-                  const desc = description.toLowerCase();
-                  if (desc.includes('food') || desc.includes('restaurant')) category = 'Food & Dining';
-                  else if (desc.includes('gas') || desc.includes('uber')) category = 'Transportation';
-                  else if (desc.includes('amazon') || desc.includes('store')) category = 'Shopping';
-                  else if (desc.includes('electric') || desc.includes('utility')) category = 'Bills & Utilities';
-                  
-                  const transaction = await storage.createTransaction({
-                    userId,
-                    description,
-                    amount,
-                    category,
-                    type,
-                    date,
-                  });
-                  
-                  transactions.push(transaction);
-                } catch (error) {
-                  // Skip invalid rows
-                }
-              })
-              .on('end', () => {
-                res.json({
-                  ...processResult,
-                  transactions_saved: transactions.length,
-                });
-              });
+            // Transactions are categorized and saved by the analytics script
+            res.json(processResult);
             
           } catch (error) {
             res.status(500).json({ message: "Failed to process CSV data" });
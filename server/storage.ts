@@ -30,6 +30,8 @@ sqlite.exec(`
     FOREIGN KEY (user_id) REFERENCES users (id)
   );
   
+  CREATE INDEX IF NOT EXISTS idx_tx_user_type_date ON transactions (user_id, type, date DESC);
+  
   CREATE TABLE IF NOT EXISTS investments (
     id TEXT PRIMARY KEY,
     user_id TEXT NOT NULL,
@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'server'))
+
+import analytics
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Run the analytics module against an empty finsight.db in a temp dir"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(analytics, '_local', analytics.threading.local())
+    conn = sqlite3.connect('finsight.db')
+    conn.execute("""
+    CREATE TABLE transactions (
+        id TEXT PRIMARY KEY,
+        user_id TEXT NOT NULL,
+        description TEXT NOT NULL,
+        amount REAL NOT NULL,
+        category TEXT NOT NULL,
+        type TEXT NOT NULL,
+        date TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def saved_rows(conn, user_id):
+    return conn.execute(
+        "SELECT description, date FROM transactions WHERE user_id = ? ORDER BY description",
+        (user_id,)
+    ).fetchall()
+
+
+def test_process_csv_keeps_local_date_of_offset_timestamps(db):
+    csv_data = (
+        "date,description,amount\n"
+        "2024-02-11T23:30:00-05:00,a,10\n"
+        "2024-03-10T22:00:00-08:00,b,20\n"
+        "2024-03-31T01:00:00+02:00,c,30\n"
+    )
+    result = analytics.process_csv_transactions(csv_data, 'u1')
+
+    assert result['transactions_saved'] == 3
+    assert saved_rows(db, 'u1') == [
+        ('a', '2024-02-11'),
+        ('b', '2024-03-10'),
+        ('c', '2024-03-31'),
+    ]
+
+
+def test_process_csv_skips_unparseable_dates(db):
+    csv_data = (
+        "date,description,amount\n"
+        "09/01/2026,a,1\n"
+        "2026-09-02,b,2\n"
+        "not a date,c,3\n"
+    )
+    result = analytics.process_csv_transactions(csv_data, 'u1')
+
+    assert result['skipped_transactions'] == 1
+    assert saved_rows(db, 'u1') == [('a', '2026-09-01'), ('b', '2026-09-02')]
+
+
+def test_process_csv_saves_non_zero_amounts_as_expenses(db):
+    csv_data = (
+        "date,description,amount\n"
+        "2024-01-02,coffee,-4.50\n"
+        "2024-01-03,groceries,30\n"
+        "2024-01-04,adjustment,0\n"
+    )
+    analytics.process_csv_transactions(csv_data, 'u1')
+
+    rows = db.execute(
+        "SELECT description, amount, type, created_at FROM transactions WHERE user_id = 'u1' ORDER BY date"
+    ).fetchall()
+    assert [row[:3] for row in rows] == [
+        ('coffee', 4.5, 'expense'),
+        ('groceries', 30.0, 'expense'),
+        ('adjustment', 0.0, 'income'),
+    ]
+    # Matches the Date.toISOString() format written by storage.ts
+    assert rows[0][3].endswith('Z') and 'T' in rows[0][3]
+
+
+@pytest.mark.parametrize('mask_fn', ['_subscription_mask', '_subscription_mask_object'])
+def test_subscription_mask(mask_fn):
+    pd = pytest.importorskip('pandas')
+
+    desc_lower = pd.Series(['netflix monthly', 'grocery store', None, 'spotify premium'], dtype=object)
+    assert getattr(analytics, mask_fn)(desc_lower).tolist() == [True, False, False, True]
+
+
+def test_analyze_spending_reports_unreadable_dates(db):
+    db.executemany(
+        "INSERT INTO transactions (id, user_id, description, amount, category, type, date) VALUES (?, 'u1', 'x', ?, 'Other', 'expense', ?)",
+        [('t1', 10.0, '2024-01-05'), ('t2', 20.0, '2024-02-05'), ('t3', 5.0, '01/20/2024')]
+    )
+    db.commit()
+    result = analytics.analyze_spending_patterns('u1')
+
+    assert result['category_analysis'] == {'Other': 35.0}
+    assert result['monthly_trends'] == {'2024-01': 10.0, '2024-02': 20.0}
+    undated = [i for i in result['insights'] if i['type'] == 'undated_expenses']
+    assert undated == [{
+        "type": "undated_expenses",
+        "message": "1 expense ($5.00) has a date that couldn't be read and is left out of monthly trends",
+        "amount": 5.0,
+        "count": 1
+    }]
+
+
+def test_categorize_descriptions_matches_categorize_transaction():
+    pd = pytest.importorskip('pandas')
+
+    descriptions = ['Starbucks #12', 'UBER TRIP', 'Netflix', 'Amazon store', 'misc', 'starbucks #12']
+    result = analytics.categorize_descriptions(pd.Series(descriptions).str.lower())
+
+    assert result.tolist() == [analytics.categorize_transaction(d, 0) for d in descriptions]
+    assert result.tolist()[:3] == ['Food & Dining', 'Transportation', 'Entertainment']